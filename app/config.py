@@ -9,10 +9,21 @@ ALPHA_VANTAGE_KEY = os.getenv("ALPHA_VANTAGE_KEY", "")
 # Embeddings / generation defaults (we’ll plug these in later steps)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "google/flan-t5-base")
+# Run the generator on CUDA (FP16) when available; off by default so CPU containers are unaffected
+USE_GPU = os.getenv("USE_GPU", "0") == "1"
+
+# "onnx" (ONNX Runtime, INT8 where supported) or "torch" (plain sentence-transformers)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx").lower()
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
 
 # Vector store and retrieval settings
 CHROMA_DIR = os.getenv("CHROMA_DIR", "storage")
 TOP_K = int(os.getenv("TOP_K", 4))
+# Serve unfiltered queries from the memory-mapped FP16 matrix (app/fast_retrieve.py) instead of HNSW
+FAST_RETRIEVE = os.getenv("FAST_RETRIEVE", "0") == "1"
+
+# Exported / optimized ONNX models are cached here (one subfolder per model)
+ONNX_DIR = os.getenv("ONNX_DIR", os.path.join(CHROMA_DIR, "onnx"))
 
 # Chunking defaults (for later)
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 600))
@@ -20,4 +31,9 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 120))
 
 # Alpha Vantage rate limit controls
 AV_RATE_LIMIT_SLEEP = int(os.getenv("AV_RATE_LIMIT_SLEEP", 13))  # free tier ~5 req/min
+AV_REQUESTS_PER_MIN = int(os.getenv("AV_REQUESTS_PER_MIN", 5))
+AV_MAX_WORKERS = int(os.getenv("AV_MAX_WORKERS", 5))
+# Raw API responses cached on disk (per day) for dev runs; set to "" to disable
+AV_CACHE_DIR = os.getenv("AV_CACHE_DIR", os.path.join(CHROMA_DIR, "av_cache"))
+AV_CACHE_MAX_ITEMS = int(os.getenv("AV_CACHE_MAX_ITEMS", 256))
 AV_BASE_URL = "https://www.alphavantage.co/query"
@@ -0,0 +1,73 @@
+# app/fast_retrieve.py
+from typing import List, Dict, Union, Tuple
+import os
+import numpy as np
+from app.index import with_collection, Embedder, encode_query, embedding_paths
+from app.config import TOP_K
+
+# collection -> (mtime of emb file, emb mmap, ids mmap); reloaded when build_index rewrites the files
+_MATRICES: Dict[str, Tuple[float, np.ndarray, np.ndarray]] = {}
+
+def has_matrix(collection_name: str = "docs") -> bool:
+    """
+    True when the FP16 mirror exists and covers every vector in the collection; otherwise
+    callers should query Chroma (e.g. a store indexed before the mirror existed).
+    """
+    if not all(os.path.exists(p) for p in embedding_paths(collection_name)):
+        return False
+    emb, ids = _load(collection_name)
+    return len(ids) == len(emb) == with_collection(collection_name, lambda c: c.count())
+
+def _load(collection_name: str) -> Tuple[np.ndarray, np.ndarray]:
+    emb_path, ids_path = embedding_paths(collection_name)
+    mtime = os.path.getmtime(emb_path)
+    cached = _MATRICES.get(collection_name)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, np.load(emb_path, mmap_mode="r"), np.load(ids_path, mmap_mode="r"))
+        _MATRICES[collection_name] = cached
+    return cached[1], cached[2]
+
+def retrieve(queries: Union[str, List[str]], k: int = TOP_K, collection_name: str = "docs") -> Union[List[Dict], List[List[Dict]]]:
+    """
+    Exact top-k by dot product over the (N, d) float16 matrix written by build_index.
+    For a few thousand normalized vectors one matrix product beats HNSW traversal + SQLite.
+    Same inputs/outputs as app.retriever.retrieve (score = 1 - dot, lower is better).
+    """
+    single = isinstance(queries, str)
+    queries_list = [queries] if single else list(queries)
+    if not queries_list:
+        return []
+
+    emb, ids = _load(collection_name)
+    if len(queries_list) == 1:
+        qmat = encode_query(queries_list[0])[None, :]
+    else:
+        qmat = Embedder().encode(queries_list).astype(np.float32)
+    # float16 matrix x float32 queries -> float32 BLAS product, shape (N, n_queries)
+    scores = emb @ qmat.T
+
+    kk = min(k, len(ids))
+    top_per_query = []
+    for j in range(len(queries_list)):
+        if kk == 0:
+            top_per_query.append([])
+            continue
+        col_scores = scores[:, j]
+        top = np.argpartition(-col_scores, kk - 1)[:kk]
+        top = top[np.argsort(-col_scores[top])]
+        top_per_query.append([(str(ids[i]), float(col_scores[i])) for i in top])
+
+    # one Chroma lookup by id for the texts/metadata of every hit
+    wanted = list({doc_id for hits in top_per_query for doc_id, _ in hits})
+    rows = {}
+    if wanted:
+        got = with_collection(collection_name, lambda c: c.get(ids=wanted, include=["documents", "metadatas"]))
+        rows = {i: (doc, meta) for i, doc, meta in zip(got["ids"], got["documents"], got["metadatas"])}
+
+    batches = []
+    for hits in top_per_query:
+        batches.append([
+            {"text": rows[doc_id][0], "meta": rows[doc_id][1], "score": 1.0 - dot}
+            for doc_id, dot in hits if doc_id in rows
+        ])
+    return batches[0] if single else batches
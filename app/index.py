@@ -1,25 +1,253 @@
 # app/index.py
-from typing import List, Dict, Callable
+from typing import Any, List, Dict, Callable, Union, Tuple, Optional
+from functools import lru_cache
+import threading
+import os
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
 from chromadb import PersistentClient
+from chromadb.api.models.Collection import Collection
 from sentence_transformers import SentenceTransformer
-from app.config import CHROMA_DIR, EMBEDDING_MODEL
+from app.config import CHROMA_DIR, EMBEDDING_MODEL, EMBED_BATCH_SIZE, EMBEDDING_BACKEND, ONNX_DIR
+from app.utils import cpu_has_flag
+
+# Loaded embedding models, shared across Embedder instances (loading MiniLM takes seconds)
+_MODEL_CACHE: Dict[str, Union["OnnxMiniLMEmbedder", SentenceTransformer]] = {}
+_MODEL_LOCK = threading.Lock()
+
+# One PersistentClient (SQLite handle + HNSW metadata) and collection handle per process
+_CLIENT = None
+_COLLECTIONS: Dict[str, Collection] = {}
+
+# Process-wide counter bumped whenever a build or clear changes stored rows; lets
+# callers (e.g. the Streamlit answer cache) key results on the index contents.
+_INDEX_VERSION = 0
+_VERSION_LOCK = threading.Lock()
+
+def index_version() -> int:
+    return _INDEX_VERSION
+
+def _bump_index_version():
+    global _INDEX_VERSION
+    with _VERSION_LOCK:
+        _INDEX_VERSION += 1
 
 def get_client():
-    return PersistentClient(path=CHROMA_DIR)
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = PersistentClient(path=CHROMA_DIR)
+    return _CLIENT
+
+# HNSW space and build/search parameters. Chroma only applies them when a collection is
+# created; a collection on another space is dropped and rebuilt by the next build_index.
+# Embeddings are L2-normalized, so inner product ranks like cosine without the L2 subtract.
+HNSW_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 100,
+    "hnsw:M": 16,
+}
+
+def collection_space(col) -> str:
+    # Chroma's default space is (squared) l2
+    return (col.metadata or {}).get("hnsw:space", "l2")
 
 def get_collection(name: str = "docs"):
+    """
+    Returns the (cached) collection, creating it with HNSW_METADATA if missing. A collection
+    left on another hnsw:space is kept as is; build_index migrates it once the new
+    embeddings are ready.
+    """
+    col = _COLLECTIONS.get(name)
+    if col is not None:
+        return col
     client = get_client()
     try:
-        return client.get_collection(name)
+        col = client.get_collection(name)
+    except Exception:
+        col = client.create_collection(name, metadata=HNSW_METADATA)
+    _COLLECTIONS[name] = col
+    return col
+
+def with_collection(name: str, fn: Callable[[Collection], Any]) -> Any:
+    """
+    Runs fn(col) on the cached collection. If another process deleted it (Chroma raises
+    "Collection ... does not exist" for the stale id), drops the cached handle, fetches
+    the collection again and retries once.
+    """
+    try:
+        return fn(get_collection(name))
+    except Exception as e:
+        if "does not exist" not in str(e):
+            raise
+        _COLLECTIONS.pop(name, None)
+        return fn(get_collection(name))
+
+def clear_collection(name: str = "docs"):
+    """Deletes the collection (so it is recreated with current HNSW settings) and its FP16 mirror."""
+    try:
+        get_client().delete_collection(name)
     except Exception:
-        return client.create_collection(name)
+        pass  # already gone
+    _COLLECTIONS.pop(name, None)
+    _bump_index_version()
+    clear_embedding_matrix(name)
+
+class OnnxMiniLMEmbedder:
+    """
+    MiniLM sentence embedder on ONNX Runtime: mean pooling over token embeddings + L2 norm,
+    matching the sentence-transformers pipeline. Exports once to ONNX_DIR/<model>/ and uses an
+    INT8 (dynamic, QInt8 weights) copy on CPUs with avx512_vnni/avx2; FP32 otherwise.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL, max_length: int = 256):
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        onnx_dir = os.path.join(ONNX_DIR, model_name.split("/")[-1])
+        fp32_path = os.path.join(onnx_dir, "model.onnx")
+        if not os.path.exists(fp32_path):
+            ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(onnx_dir)
+
+        model_path = fp32_path
+        if cpu_has_flag("avx512_vnni") or cpu_has_flag("avx2"):
+            model_path = os.path.join(onnx_dir, "model_quantized.onnx")
+            if not os.path.exists(model_path):
+                quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        # transformers exports name it last_hidden_state; sentence-transformers exports token_embeddings
+        self._output_name = next((n for n in ("last_hidden_state", "token_embeddings") if n in outputs), outputs[0])
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = True) -> np.ndarray:
+        # show_progress_bar / convert_to_numpy are accepted for SentenceTransformer compatibility
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in feed:
+                feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+            tokens = self.session.run([self._output_name], feed)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            x = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                x = x / np.clip(np.linalg.norm(x, axis=1, keepdims=True), 1e-12, None)
+            batches.append(x.astype(np.float32))
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(batches, axis=0)
+
+def _get_or_load(model_name: str) -> Union[OnnxMiniLMEmbedder, SentenceTransformer]:
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(model_name)
+        if model is None:
+            if EMBEDDING_BACKEND == "onnx":
+                model = OnnxMiniLMEmbedder(model_name)
+            else:
+                model = SentenceTransformer(model_name)
+            _MODEL_CACHE[model_name] = model
+        return model
 
 class Embedder:
     def __init__(self, model_name: str = EMBEDDING_MODEL):
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.model = _get_or_load(model_name)
 
     def encode(self, texts: List[str]):
-        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        # Smart batching: encode in length order so each mini-batch pads only to
+        # its own longest text, then restore the caller's order.
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        embeddings = self.model.encode(
+            sorted_texts,
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return embeddings[np.argsort(order)]
+
+@lru_cache(maxsize=1024)
+def _cached_embed_query(text: str, model_name: str) -> tuple:
+    # tuples are hashable/immutable, so callers can't mutate a cached vector
+    vec = _get_or_load(model_name).encode([text], normalize_embeddings=True, convert_to_numpy=True)[0]
+    return tuple(vec.tolist())
+
+def encode_query(text: str, model_name: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Embeds a single query string; repeated queries are served from an LRU cache."""
+    return np.asarray(_cached_embed_query(text, model_name), dtype=np.float32)
+
+def get_performance_stats() -> Dict:
+    info = _cached_embed_query.cache_info()
+    return {
+        "models_loaded": len(_MODEL_CACHE),
+        "query_cache_hits": info.hits,
+        "query_cache_misses": info.misses,
+        "query_cache_size": info.currsize,
+    }
+
+def embedding_paths(collection_name: str = "docs") -> Tuple[str, str]:
+    """Paths of the FP16 embedding matrix and its parallel id array for a collection."""
+    return (os.path.join(CHROMA_DIR, f"{collection_name}_emb.npy"),
+            os.path.join(CHROMA_DIR, f"{collection_name}_ids.npy"))
+
+def _atomic_save(path: str, arr: np.ndarray):
+    # write-then-rename so readers holding an mmap of the old file never see a truncated one
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+def _save_embedding_matrix(col, collection_name: str, ids: List[str], embeddings: Optional[np.ndarray],
+                           removed_ids: List[str] = ()):
+    """
+    Mirrors the collection's vectors as a contiguous float16 (N, d) matrix + ids array so
+    app.fast_retrieve can brute-force search it. Call after writing to `col`: rows in `ids`
+    are replaced like upsert and removed_ids dropped like delete. When the mirror is missing,
+    has the wrong shape, or ends up with a different row count than the collection, it is
+    re-seeded from all vectors stored in Chroma.
+    """
+    emb_path, ids_path = embedding_paths(collection_name)
+    new_emb = None if embeddings is None else np.asarray(embeddings, dtype=np.float16)
+    merged = None
+    if os.path.exists(emb_path) and os.path.exists(ids_path):
+        old_ids = np.load(ids_path)
+        old_emb = np.load(emb_path)
+        if len(old_ids) == len(old_emb) and (new_emb is None or old_emb.shape[1:] == new_emb.shape[1:]):
+            if new_emb is None and not removed_ids:
+                merged = (old_ids, old_emb)  # nothing changed
+            else:
+                keep = ~np.isin(old_ids, list(ids) + list(removed_ids))
+                merged = (
+                    np.concatenate([old_ids[keep], np.array(ids, dtype=str)]),
+                    old_emb[keep] if new_emb is None else np.concatenate([old_emb[keep], new_emb]),
+                )
+
+    count = col.count()
+    if merged is None or len(merged[0]) != count:
+        if count == 0:
+            clear_embedding_matrix(collection_name)
+            return
+        got = col.get(include=["embeddings"])
+        merged = (np.array(got["ids"], dtype=str), np.asarray(got["embeddings"], dtype=np.float16))
+    elif new_emb is None and not removed_ids:
+        return
+
+    os.makedirs(CHROMA_DIR, exist_ok=True)
+    _atomic_save(ids_path, merged[0])
+    _atomic_save(emb_path, merged[1])
+
+def clear_embedding_matrix(collection_name: str = "docs"):
+    for path in embedding_paths(collection_name):
+        if os.path.exists(path):
+            os.remove(path)
 
 def build_index(docs: List[Dict], chunker: Callable[[str], List[str]], collection_name: str = "docs"):
     """
@@ -28,6 +256,7 @@ def build_index(docs: List[Dict], chunker: Callable[[str], List[str]], collectio
     """
     col = get_collection(collection_name)
     embedder = Embedder()
+    embedder_id = f"{EMBEDDING_BACKEND}:{embedder.model_name}"
 
     ids, texts, metadatas = [], [], []
     for d in docs:
@@ -41,15 +270,42 @@ def build_index(docs: List[Dict], chunker: Callable[[str], List[str]], collectio
                 "chunk": i,
                 "doc_id": d["id"],
                 "type": d.get("type", "api/alpha_vantage"),
+                # rows embedded by another model/backend must be re-embedded
+                "embedder": embedder_id,
             })
 
     if not texts:
         return 0
 
-    embeddings = embedder.encode(texts)
-    try:
-        col.delete(where={})
-    except Exception:
-        pass
-    col.add(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+    # A collection on another hnsw:space (e.g. l2 from before the switch to ip) is re-embedded
+    # in full and swapped in only after encoding succeeds; readers keep the old one until then.
+    migrate = collection_space(col) != HNSW_METADATA["hnsw:space"]
+
+    # The collection mirrors the latest build: rows from earlier builds that are not in
+    # this one (dropped symbols, days outside the window) are deleted.
+    current, stale = {}, []
+    if not migrate:
+        col, existing = with_collection(collection_name, lambda c: (c, c.get(include=["documents", "metadatas"])))
+        current = {i: (doc, meta) for i, doc, meta in zip(existing["ids"], existing["documents"], existing["metadatas"])}
+        new_ids = set(ids)
+        stale = [i for i in current if i not in new_ids]
+
+    # Time-series ids are keyed by date (e.g. av/AAPL/daily/2024-01-02), so a re-index only
+    # embeds and upserts rows whose text or metadata actually changed.
+    changed = [j for j, i in enumerate(ids) if current.get(i) != (texts[j], metadatas[j])]
+    ch_ids, embeddings = [ids[j] for j in changed], None
+    if changed:
+        embeddings = embedder.encode([texts[j] for j in changed])
+
+    if migrate:
+        clear_collection(collection_name)
+        col = get_collection(collection_name)
+    if stale:
+        col.delete(ids=stale)
+    if changed:
+        col.upsert(ids=ch_ids, embeddings=embeddings,
+                   documents=[texts[j] for j in changed], metadatas=[metadatas[j] for j in changed])
+    _save_embedding_matrix(col, collection_name, ch_ids, embeddings, removed_ids=stale)
+    if changed or stale:
+        _bump_index_version()
     return len(ids)
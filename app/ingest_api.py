@@ -1,52 +1,124 @@
 # app/ingest_api.py
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable, Hashable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+import threading
 import time
 import re
 import requests
-from datetime import datetime
-from app.config import ALPHA_VANTAGE_KEY, AV_BASE_URL, AV_RATE_LIMIT_SLEEP
+from joblib import Memory
+from datetime import date, datetime, timedelta
+from app.config import (
+    ALPHA_VANTAGE_KEY, AV_BASE_URL, AV_RATE_LIMIT_SLEEP,
+    AV_REQUESTS_PER_MIN, AV_MAX_WORKERS, AV_CACHE_DIR, AV_CACHE_MAX_ITEMS,
+)
+
+# On-disk cache of raw API responses so repeated dev runs skip the network (AV_CACHE_DIR="" disables).
+# Only successful payloads are cached: _fetch raises on throttle/quota/error replies.
+_memory = Memory(AV_CACHE_DIR, verbose=0) if AV_CACHE_DIR else None
+
+def _prune_cache():
+    # entries are keyed by day, so anything older than a day can never be hit again
+    if _memory is not None:
+        _memory.reduce_size(items_limit=AV_CACHE_MAX_ITEMS, age_limit=timedelta(days=1))
+
+class _RateLimiter:
+    """Token bucket: at most `per_minute` requests in any rolling 60s window, shared across threads."""
+    def __init__(self, per_minute: int):
+        self._tokens = threading.BoundedSemaphore(max(1, per_minute))
+
+    def acquire(self):
+        self._tokens.acquire()
+        # hand the token back once it has aged out of the window
+        t = threading.Timer(60.0, self._tokens.release)
+        t.daemon = True
+        t.start()
+
+class _Uncacheable(Exception):
+    """Raised inside the cached _fetch for replies that must not be cached; carries the payload to return."""
+    def __init__(self, payload: Dict, reason: str):
+        super().__init__(reason)
+        self.payload = payload
+
+# Per-minute / per-second throttling is worth retrying; premium-endpoint and daily-quota
+# notices are not (they won't change within this run)
+_THROTTLE_HINTS = ("per minute", "per second", "spreading out")
+
+def _is_throttle(message: str) -> bool:
+    m = message.lower()
+    return "premium" not in m and any(h in m for h in _THROTTLE_HINTS)
+
+def _fetch(client: "AVClient", params: Dict, day: str, expect: str) -> Dict:
+    # `day` only feeds the cache key, so cached responses expire daily
+    return client._fetch(params, expect)
+
+_cached_fetch = _memory.cache(_fetch, ignore=["client"]) if _memory is not None else _fetch
 
 class AVClient:
-    """Thin Alpha Vantage client with conservative backoff for free tier."""
-    def __init__(self, api_key: str):
+    """Thin Alpha Vantage client with conservative backoff for free tier. Safe to share across threads."""
+    def __init__(self, api_key: str, requests_per_min: int = AV_REQUESTS_PER_MIN):
         if not api_key:
             raise ValueError("Missing Alpha Vantage API key. Set ALPHA_VANTAGE_KEY in .env.")
         self.api_key = api_key
         self.sess = requests.Session()
+        self.limiter = _RateLimiter(requests_per_min)
+        _prune_cache()
+
+    def _get(self, expect: str, **params) -> Dict:
+        """
+        expect: substring (case-insensitive) of a top-level key a valid payload must contain,
+        e.g. "time series". Payloads without it (premium/quota notices, {} for unknown tickers)
+        are returned uncached, so the passage builders just produce nothing for that endpoint.
+        """
+        # cache key is (function, symbol, market, outputsize, ...) + today; the API key is never part of it
+        try:
+            return _cached_fetch(self, params, date.today().isoformat(), expect)
+        except _Uncacheable as e:
+            return e.payload
 
-    def _get(self, **params) -> Dict:
-        params["apikey"] = self.api_key
+    def _fetch(self, params: Dict, expect: str) -> Dict:
+        params = {**params, "apikey": self.api_key}
+        message = ""
         # up to 5 attempts with sleep if throttled
         for _ in range(5):
+            self.limiter.acquire()
             r = self.sess.get(AV_BASE_URL, params=params, timeout=30)
             r.raise_for_status()
             data = r.json()
-            # Throttle message returns a "Note" field
-            if isinstance(data, dict) and any(k.lower() == "note" for k in data.keys()):
-                time.sleep(AV_RATE_LIMIT_SLEEP)
-                continue
+            if not isinstance(data, dict):
+                raise _Uncacheable({}, f"unexpected payload for {params['function']}")
+            # Throttle / premium / quota replies come back as a "Note" or (current API) "Information" field
+            notice = next((v for k, v in data.items() if k.lower() in ("note", "information")), None)
+            if notice is not None:
+                message = str(notice)
+                if _is_throttle(message):
+                    time.sleep(AV_RATE_LIMIT_SLEEP)
+                    continue
+                raise _Uncacheable({}, message)
             if "Error Message" in data:
                 raise RuntimeError(data["Error Message"])
+            if not any(expect in k.lower() for k in data.keys()):
+                raise _Uncacheable(data, f"no '{expect}' data for {params['function']}")
             return data
-        raise RuntimeError("Alpha Vantage rate limit: retries exceeded")
+        raise RuntimeError(f"Alpha Vantage rate limit: retries exceeded ({message})")
 
     # ------------ Stock endpoints ------------
     def daily_adjusted(self, symbol: str, outputsize: str = "compact") -> Dict:
-        return self._get(function="TIME_SERIES_DAILY_ADJUSTED", symbol=symbol, outputsize=outputsize)
+        return self._get("time series", function="TIME_SERIES_DAILY_ADJUSTED", symbol=symbol, outputsize=outputsize)
 
     def overview(self, symbol: str) -> Dict:
-        return self._get(function="OVERVIEW", symbol=symbol)
+        return self._get("symbol", function="OVERVIEW", symbol=symbol)
 
     def earnings(self, symbol: str) -> Dict:
-        return self._get(function="EARNINGS", symbol=symbol)
+        return self._get("earnings", function="EARNINGS", symbol=symbol)
 
     # ------------ Crypto endpoints ------------
     def crypto_daily(self, symbol: str, market: str = "USD") -> Dict:
-        return self._get(function="DIGITAL_CURRENCY_DAILY", symbol=symbol, market=market)
+        return self._get("time series", function="DIGITAL_CURRENCY_DAILY", symbol=symbol, market=market)
 
     # (Optional) News
     def news(self, symbols_csv: str, limit: int = 50) -> Dict:
-        return self._get(function="NEWS_SENTIMENT", tickers=symbols_csv, limit=limit)
+        return self._get("feed", function="NEWS_SENTIMENT", tickers=symbols_csv, limit=limit)
 
 
 # ----- Serialization helpers: JSON -> natural language passages -----
@@ -59,84 +131,117 @@ def _kv_to_text(title: str, kv: Dict) -> str:
         lines.append(f"- {k}: {v}")
     return "\n".join(lines)
 
-def _ts_stock_passages(symbol: str, ts_json: Dict, max_days: int = 365) -> List[str]:
+_OHLCV_FIELDS = ("open", "high", "low", "close", "volume")
+
+def _first_present(row: dict, *keys: str) -> Optional[str]:
+    return next((k for k in keys if k in row), None)
+
+def _resolve_stock_keys(row: dict) -> Dict[str, Optional[str]]:
+    """Maps open/high/low/close/volume to the keys used by this daily series (resolved once per series)."""
+    return {
+        "open": _first_present(row, "1. open"),
+        "high": _first_present(row, "2. high"),
+        "low": _first_present(row, "3. low"),
+        "close": _first_present(row, "4. close", "5. adjusted close"),
+        "volume": _first_present(row, "6. volume", "5. volume", "volume"),
+    }
+
+def _ts_stock_passages(symbol: str, ts_json: Dict, max_days: int = 365) -> List[Tuple[str, str]]:
+    """Returns (date, passage) pairs, newest first."""
     key = next((k for k in ts_json.keys() if "Time Series" in k), None)
     if not key:
         return []
     series = ts_json[key]
+    if not series:
+        return []
+
+    key_map = _resolve_stock_keys(next(iter(series.values())))
+    ko, kh, kl, kc, kv = (key_map[f] for f in _OHLCV_FIELDS)
     items = sorted(series.items(), key=lambda x: x[0], reverse=True)[:max_days]
-    out = []
-    for date_str, row in items:
-        o = row.get("1. open"); h = row.get("2. high"); l = row.get("3. low")
-        c = row.get("4. close") or row.get("5. adjusted close")
-        v = row.get("6. volume") or row.get("5. volume") or row.get("volume")
-        out.append(f"{symbol} daily bar on {date_str}: open {o}, high {h}, low {l}, close {c}, volume {v}.")
-    return out
-
-def _pick_crypto_price(row: dict, field_base: str, market: str):
+    rows_fields = [(d, r.get(ko), r.get(kh), r.get(kl), r.get(kc), r.get(kv)) for d, r in items]
+    return [
+        (d, f"{symbol} daily bar on {d}: open {o}, high {h}, low {l}, close {c}, volume {v}.")
+        for d, o, h, l, c, v in rows_fields
+    ]
+
+@lru_cache(maxsize=32)
+def _crypto_patterns(field_base: str, market: str) -> Tuple[re.Pattern, re.Pattern]:
+    """Compiled (exact market, any currency) key patterns for one (field, market) pair."""
+    return (
+        re.compile(rf"\b\d+[ab]\.\s*{re.escape(field_base)}\s*\(\s*{re.escape(market)}\s*\)", re.I),
+        re.compile(rf"\b\d+[ab]\.\s*{re.escape(field_base)}\s*\(\s*[A-Z]{{3,}}\s*\)", re.I),
+    )
+
+def _pick_crypto_key(row: dict, field_base: str, market: str) -> Optional[str]:
     """
-    Returns the value for a crypto field like 'open'|'high'|'low'|'close'.
+    Returns the key holding a crypto field like 'open'|'high'|'low'|'close'.
     Preference order:
       1) exact market match (e.g., '(USD)')
       2) any currency match (fallback)
     Matches both '1a. open (USD)' and '1b. open (USD)' etc.
     """
+    pat_exact, pat_any = _crypto_patterns(field_base, market)
+
     # 1) exact market match
-    pat_exact = re.compile(rf"\b\d+[ab]\.\s*{re.escape(field_base)}\s*\(\s*{re.escape(market)}\s*\)\b", re.I)
-    for k, v in row.items():
+    for k in row:
         if pat_exact.search(k):
-            return v
+            return k
 
     # 2) any currency match for that field (fallback)
-    pat_any = re.compile(rf"\b\d+[ab]\.\s*{re.escape(field_base)}\s*\(\s*[A-Z]{{3,}}\s*\)\b", re.I)
-    for k, v in row.items():
+    for k in row:
         if pat_any.search(k):
-            return v
+            return k
 
     # 3) last-ditch: any key containing the field_base (e.g., 'close') if above failed
-    for k, v in row.items():
+    for k in row:
         if field_base.lower() in k.lower():
-            return v
+            return k
 
     return None
 
+_CRYPTO_PLAIN_KEYS = {"open": "1. open", "high": "2. high", "low": "3. low", "close": "4. close"}
 
-def _ts_crypto_passages(symbol: str, market: str, json_obj: Dict, max_days: int = 365) -> List[str]:
+def _resolve_crypto_keys(row: dict, market: str) -> Dict[str, Optional[str]]:
+    """
+    Maps each of open/high/low/close/volume to the concrete key used by this series.
+    All rows of one series share a schema, so this runs once instead of per row.
+    """
+    key_map: Dict[str, Optional[str]] = {}
+    for field, plain in _CRYPTO_PLAIN_KEYS.items():
+        # 1) plain numeric keys (e.g. '4. close'), 2) (market) variants / fuzzy match
+        key_map[field] = plain if plain in row else _pick_crypto_key(row, field, market)
+    key_map["volume"] = _first_present(row, "5. volume", "6. market cap (usd)")
+    return key_map
+
+def _ts_crypto_passages(symbol: str, market: str, json_obj: Dict, max_days: int = 365) -> List[Tuple[str, str]]:
+    """Returns (date, passage) pairs, newest first."""
     # Find the time series key case-insensitively
     ts_key = next((k for k in json_obj.keys() if "time series" in k.lower()), None)
     if not ts_key:
         return []
     series = json_obj[ts_key]
+    if not series:
+        return []
 
+    key_map = _resolve_crypto_keys(next(iter(series.values())), market)
+    ko, kh, kl, kc, kv = (key_map[f] for f in _OHLCV_FIELDS)
     items = sorted(series.items(), key=lambda x: x[0], reverse=True)[:max_days]
-    out = []
-    for date_str, row in items:
-        # 1) Try plain numeric keys (your output shows this format)
-        o = row.get("1. open")
-        h = row.get("2. high")
-        l = row.get("3. low")
-        c = row.get("4. close")
-        v = row.get("5. volume") or row.get("6. market cap (usd)")
+    rows_fields = [(d, r.get(ko), r.get(kh), r.get(kl), r.get(kc), r.get(kv)) for d, r in items]
+    return [
+        (d, f"{symbol}/{market} on {d}: open {o}, high {h}, low {l}, close {c}, volume {v}.")
+        for d, o, h, l, c, v in rows_fields
+    ]
 
-        # 2) Fallback to (market) variants if any are missing
-        if o is None:
-            o = row.get(f"1a. open ({market})") or row.get(f"1b. open ({market})")
-        if h is None:
-            h = row.get(f"2a. high ({market})") or row.get(f"2b. high ({market})")
-        if l is None:
-            l = row.get(f"3a. low ({market})") or row.get(f"3b. low ({market})")
-        if c is None:
-            c = row.get(f"4a. close ({market})") or row.get(f"4b. close ({market})")
-
-        # 3) Last-ditch: any key that contains the field name
-        if c is None:
-            c = next((val for k, val in row.items() if "close" in k.lower()), None)
-
-        out.append(f"{symbol}/{market} on {date_str}: open {o}, high {h}, low {l}, close {c}, volume {v}.")
-    return out
 
 
 
+def _fetch_concurrently(calls: Dict[Hashable, Callable[[], Dict]]) -> Dict[Hashable, Dict]:
+    """Runs the (network-bound) API calls on a thread pool; the client's rate limiter bounds throughput."""
+    if not calls:
+        return {}
+    with ThreadPoolExecutor(max_workers=AV_MAX_WORKERS) as pool:
+        futures = {key: pool.submit(fn) for key, fn in calls.items()}
+        return {key: f.result() for key, f in futures.items()}
 
 def build_api_docs(
     symbols_stocks: List[str],
@@ -153,27 +258,45 @@ def build_api_docs(
     """
     client = AVClient(ALPHA_VANTAGE_KEY)
     docs: List[Dict] = []
+    outputsize = "full" if days > 100 else "compact"
+    universe = ",".join(symbols_stocks) if symbols_stocks else ""
+
+    # Dispatch every endpoint for every symbol at once; docs are assembled below in the usual order
+    calls: Dict[Hashable, Callable[[], Dict]] = {}
+    for sym in symbols_stocks:
+        if include_overview:
+            calls[("overview", sym)] = partial(client.overview, sym)
+        calls[("daily", sym)] = partial(client.daily_adjusted, sym, outputsize=outputsize)
+        if include_earnings:
+            calls[("earnings", sym)] = partial(client.earnings, sym)
+    for sym in symbols_crypto:
+        calls[("crypto", sym)] = partial(client.crypto_daily, sym, market=market)
+    # Alpha Vantage NEWS_SENTIMENT is mostly equity ticker oriented
+    if include_news and universe:
+        calls[("news", universe)] = partial(client.news, universe, limit=40)
+    results = _fetch_concurrently(calls)
 
     # Stocks
     for sym in symbols_stocks:
         if include_overview:
-            ov = client.overview(sym)
+            ov = results[("overview", sym)]
             docs.append({
                 "id": f"av/{sym}/overview",
                 "text": _kv_to_text(f"{sym} Company Overview", ov),
                 "source": "alpha_vantage:overview",
                 "type": "api/alpha_vantage"
             })
-        ts = client.daily_adjusted(sym, outputsize="full" if days > 100 else "compact")
-        for i, passage in enumerate(_ts_stock_passages(sym, ts, max_days=days)):
+        ts = results[("daily", sym)]
+        # keyed by bar date so a day's passage keeps its id across re-indexes
+        for date_str, passage in _ts_stock_passages(sym, ts, max_days=days):
             docs.append({
-                "id": f"av/{sym}/daily#{i}",
+                "id": f"av/{sym}/daily/{date_str}",
                 "text": passage,
                 "source": "alpha_vantage:time_series_daily_adjusted",
                 "type": "api/alpha_vantage"
             })
         if include_earnings:
-            er = client.earnings(sym)
+            er = results[("earnings", sym)]
             docs.append({
                 "id": f"av/{sym}/earnings",
                 "text": _kv_to_text(f"{sym} Earnings (AV)", er),
@@ -183,10 +306,10 @@ def build_api_docs(
 
     # Crypto
     for sym in symbols_crypto:
-        crypto_json = client.crypto_daily(sym, market=market)
-        for i, passage in enumerate(_ts_crypto_passages(sym, market, crypto_json, max_days=days)):
+        crypto_json = results[("crypto", sym)]
+        for date_str, passage in _ts_crypto_passages(sym, market, crypto_json, max_days=days):
             docs.append({
-                "id": f"av/{sym}-{market}/digital_daily#{i}",
+                "id": f"av/{sym}-{market}/digital_daily/{date_str}",
                 "text": passage,
                 "source": "alpha_vantage:digital_currency_daily",
                 "type": "api/alpha_vantage"
@@ -194,10 +317,8 @@ def build_api_docs(
 
     # Optional news for both
     if include_news and (symbols_stocks or symbols_crypto):
-        universe = ",".join(symbols_stocks) if symbols_stocks else ""
-        # Alpha Vantage NEWS_SENTIMENT is mostly equity ticker oriented
         if universe:
-            news_json = client.news(universe, limit=40)
+            news_json = results[("news", universe)]
             feed = news_json.get("feed", [])[:40]
             for j, item in enumerate(feed):
                 dt = item.get("time_published")
@@ -1,8 +1,10 @@
 # app/rag_chain.py
 from typing import List, Tuple
+from operator import itemgetter
 import re
 from app.retriever import retrieve
 from app.generator import LocalGenerator
+from app import textscan
 
 gen = LocalGenerator()
 
@@ -16,6 +18,12 @@ SYSTEM_PROMPT = (
 
 CHUNK_MAX_CHARS = 800
 
+# Company queries search overviews and everything else separately (Chroma metadata pre-filter)
+_OVERVIEW_SOURCE = "alpha_vantage:overview"
+_OVERVIEW_WHERE = {"source": _OVERVIEW_SOURCE}
+_NON_OVERVIEW_WHERE = {"source": {"$ne": _OVERVIEW_SOURCE}}
+_OVERVIEW_K = 4
+
 _company_keywords = {"company", "overview", "summary", "profile", "about", "headquarters", "sector", "industry"}
 _numeric_keywords = {"close", "open", "volume", "high", "low", "price"}
 
@@ -40,14 +48,45 @@ def _contains_numeric_request(query: str) -> bool:
     q = query.lower()
     return any(k in q for k in _numeric_keywords)
 
+_by_score = itemgetter("score")
+
 def _prioritize_chunks(chunks: List[dict], query: str) -> List[dict]:
     overviews = [ch for ch in chunks if ("overview" in ch.get("meta", {}).get("doc_id", "").lower()) or ("overview" in ch.get("meta", {}).get("type", "").lower())]
-    others = [ch for ch in chunks if ch not in overviews]
-    overviews = sorted(overviews, key=lambda ch: ch.get("score", float("inf")))
-    others = sorted(others, key=lambda ch: ch.get("score", float("inf")))
+    # identity set: O(1) membership instead of comparing dicts against every overview
+    overview_ids = {id(ch) for ch in overviews}
+    others = [ch for ch in chunks if id(ch) not in overview_ids]
+    # retrieve() always sets "score"
+    overviews = sorted(overviews, key=_by_score)
+    others = sorted(others, key=_by_score)
     # Put overviews first so summaries come from them
     return overviews + others
 
+def _retrieve_candidates(queries: List[str], k: int) -> List[List[dict]]:
+    """
+    Retrieves ordered candidates per query. Company queries fetch overviews and other
+    rows with two metadata-filtered searches, keep the k best of both by score and put
+    the overviews among them first; other queries go through _prioritize_chunks as before.
+    """
+    results: List[List[dict]] = [[] for _ in queries]
+    company_idx = [i for i, q in enumerate(queries) if _is_company_query(q)]
+    other_idx = [i for i, q in enumerate(queries) if not _is_company_query(q)]
+
+    if other_idx:
+        qs = [queries[i] for i in other_idx]
+        for i, hits in zip(other_idx, retrieve(qs, k=k)):
+            results[i] = _prioritize_chunks(hits, queries[i])
+    if company_idx:
+        qs = [queries[i] for i in company_idx]
+        overviews = retrieve(qs, k=_OVERVIEW_K, where=_OVERVIEW_WHERE)
+        rest = retrieve(qs, k=k, where=_NON_OVERVIEW_WHERE)
+        for i, ov, other in zip(company_idx, overviews, rest):
+            # both lists come back sorted by score; an overview weaker than the k-th
+            # non-overview hit falls out here instead of being forced to the front
+            top = sorted(ov + other, key=_by_score)[:k]
+            ov_ids = {id(ch) for ch in ov}
+            results[i] = [ch for ch in top if id(ch) in ov_ids] + [ch for ch in top if id(ch) not in ov_ids]
+    return results
+
 def _build_prompt(query: str, chunks: List[dict]) -> str:
     # Simplified prompt for better model performance
     if _contains_numeric_request(query):
@@ -75,37 +114,35 @@ def _build_prompt(query: str, chunks: List[dict]) -> str:
 # regex to detect bracket-only answers like "[3]" or "[1],[2]"
 _BRACKET_ONLY_RE = re.compile(r'^\s*(\[\s*\d+\s*\]\s*(,\s*\[\s*\d+\s*\]\s*)*)\s*$')
 
-# numeric extraction regex (captures typical decimal numbers)
-_NUMERIC_RE = re.compile(r'[-+]?\d{1,3}(?:[,\d]{0,})?(?:\.\d+)?')
+# numeric / sentence-boundary regexes live next to the byte scanners that mirror them
+_NUMERIC_RE = textscan.NUMERIC_RE
+_SENTENCE_RE = textscan.SENTENCE_RE
+
+# "close 123,456.78" inside time-series passages
+_CLOSE_RE = re.compile(r'close\s+([0-9,]+\.?[0-9]*)', re.IGNORECASE)
 
 def _extract_numeric_from_text(text: str) -> str:
-    # find all numeric tokens, return the first plausible one (prefer decimals)
-    matches = _NUMERIC_RE.findall(text)
-    if not matches:
-        return ""
-    # return first match (strip commas)
-    return matches[0].replace(",", "")
+    # only the first numeric token is used (strip commas)
+    if textscan.jit_ready():
+        return textscan.first_number(text).replace(",", "")
+    # regex path until the numba scanner has compiled (or when numba is missing)
+    m = _NUMERIC_RE.search(text)
+    return m.group(0).replace(",", "") if m else ""
 
 def _first_sentence(text: str) -> str:
     # naive first-sentence extraction
     text = text.strip().replace("\n", " ")
-    m = re.search(r'(.+?[\.!?])\s', text)
-    if m:
-        return m.group(1)
+    if textscan.jit_ready():
+        sentence = textscan.first_sentence(text)
+    else:
+        m = _SENTENCE_RE.search(text)
+        sentence = m.group(1) if m else None
+    if sentence:
+        return sentence
     # fallback: return up to 200 chars
     return text[:200].rsplit(" ", 1)[0] + ("..." if len(text) > 200 else "")
 
-def answer(query: str, k: int = 6, max_new_tokens: int = 100) -> Tuple[str, List[dict]]:
-    candidates = retrieve(query, k=k)
-    prioritized = _prioritize_chunks(candidates, query)
-    chunks_for_prompt = prioritized[:4]
-    
-    # Use simplified prompt
-    prompt = _build_prompt(query, chunks_for_prompt)
-    
-    # Generate answer with shorter max tokens for cleaner output
-    out = gen(prompt, max_new_tokens=max_new_tokens)
-    
+def _finalize_answer(query: str, out: str, chunks_for_prompt: List[dict]) -> str:
     # Clean up the output
     answer_text = out.strip()
     
@@ -118,20 +155,42 @@ def answer(query: str, k: int = 6, max_new_tokens: int = 100) -> Tuple[str, List
             
             # Look for price patterns in the text
             if "close" in text.lower():
-                import re
-                close_match = re.search(r'close\s+([0-9,]+\.?[0-9]*)', text, re.IGNORECASE)
+                close_match = _CLOSE_RE.search(text)
                 if close_match:
-                    return f"BTC close price: {close_match.group(1)}", chunks_for_prompt
+                    return f"BTC close price: {close_match.group(1)}"
             
             # General numeric extraction
             num = _extract_numeric_from_text(text)
             if num:
-                return f"Price: {num}", chunks_for_prompt
+                return f"Price: {num}"
         
         # Fallback for other queries
         if chunks_for_prompt:
-            return _first_sentence(chunks_for_prompt[0]["text"]), chunks_for_prompt
+            return _first_sentence(chunks_for_prompt[0]["text"])
         
-        return "I don't know.", chunks_for_prompt
+        return "I don't know."
+    
+    return answer_text
+
+def answer(query: str, k: int = 6, max_new_tokens: int = 100) -> Tuple[str, List[dict]]:
+    chunks_for_prompt = _retrieve_candidates([query], k)[0][:4]
+    
+    # Use simplified prompt
+    prompt = _build_prompt(query, chunks_for_prompt)
+    
+    # Generate answer with shorter max tokens for cleaner output
+    out = gen(prompt, max_new_tokens=max_new_tokens)
     
-    return answer_text, chunks_for_prompt
+    return _finalize_answer(query, out, chunks_for_prompt), chunks_for_prompt
+
+def answer_batch(queries: List[str], k: int = 6, max_new_tokens: int = 100) -> List[Tuple[str, List[dict]]]:
+    """Like answer() for several queries: one batched retrieval and one batched generate() call."""
+    if not queries:
+        return []
+    chunks_per_query = [c[:4] for c in _retrieve_candidates(list(queries), k)]
+    prompts = [_build_prompt(q, chunks) for q, chunks in zip(queries, chunks_per_query)]
+    outs = gen.generate_batch(prompts, max_new_tokens=max_new_tokens)
+    return [
+        (_finalize_answer(q, out, chunks), chunks)
+        for q, out, chunks in zip(queries, outs, chunks_per_query)
+    ]
@@ -1,7 +1,8 @@
 # app/retriever.py
-from typing import List, Dict
-from app.index import get_collection, Embedder
-from app.config import TOP_K
+from typing import List, Dict, Union, Optional
+from app.index import with_collection, collection_space, Embedder, encode_query
+from app.config import TOP_K, FAST_RETRIEVE
+from app import fast_retrieve
 
 _embedder = None
 
@@ -11,12 +12,37 @@ def _get_embedder():
         _embedder = Embedder()
     return _embedder
 
-def retrieve(query: str, k: int = TOP_K, collection_name: str = "docs") -> List[Dict]:
-    col = get_collection(collection_name)
-    qvec = _get_embedder().encode([query])[0]
-    out = col.query(query_embeddings=[qvec], n_results=k,
-                    include=["documents", "metadatas", "distances"])
-    results = []
-    for doc, meta, dist in zip(out["documents"][0], out["metadatas"][0], out["distances"][0]):
-        results.append({"text": doc, "meta": meta, "score": float(dist)})
-    return results
+def retrieve(queries: Union[str, List[str]], k: int = TOP_K, collection_name: str = "docs",
+             where: Optional[Dict] = None) -> Union[List[Dict], List[List[Dict]]]:
+    """
+    queries: a single query string, or a list of queries searched in one Chroma call.
+    where: optional Chroma metadata filter, e.g. {"source": "alpha_vantage:overview"}.
+    Returns a list of hits for a string, or one list of hits per query for a list.
+    """
+    single = isinstance(queries, str)
+    queries_list = [queries] if single else list(queries)
+    if not queries_list:
+        return []
+    if FAST_RETRIEVE and where is None and fast_retrieve.has_matrix(collection_name):
+        return fast_retrieve.retrieve(queries, k=k, collection_name=collection_name)
+
+    if len(queries_list) == 1:
+        # single queries hit the LRU query cache
+        qvecs = [encode_query(queries_list[0]).tolist()]
+    else:
+        qvecs = _get_embedder().encode(queries_list).tolist()
+    col, out = with_collection(collection_name, lambda c: (c, c.query(
+        query_embeddings=qvecs, n_results=k, where=where, include=["documents", "metadatas", "distances"])))
+
+    # With hnsw:space=ip (and cosine), Chroma already reports 1 - dot as the distance, so
+    # "lower is better" (which _prioritize_chunks relies on) still holds. A collection still on
+    # l2 (created before the switch) reports ||a-b||^2 = 2 - 2*dot for unit vectors, so halve it
+    # to keep scores on the same 1 - dot scale as app.fast_retrieve.
+    scale = 0.5 if collection_space(col) == "l2" else 1.0
+    batches = []
+    for docs, metas, dists in zip(out["documents"], out["metadatas"], out["distances"]):
+        batches.append([
+            {"text": doc, "meta": meta, "score": float(dist) * scale}
+            for doc, meta, dist in zip(docs, metas, dists)
+        ])
+    return batches[0] if single else batches
@@ -2,7 +2,7 @@
 from app.ingest_api import build_api_docs
 from app.index import build_index
 from app.utils import identity_chunk
-from app.rag_chain import answer
+from app.rag_chain import answer_batch
 
 if __name__ == "__main__":
     # 1) Fetch a small set (fast)
@@ -25,9 +25,8 @@ if __name__ == "__main__":
         "What was BTC/USD close yesterday?",
         "Summarize Apple Inc company overview briefly.",
     ]
-    for q in queries:
+    for q, (ans, chunks) in zip(queries, answer_batch(queries, k=4, max_new_tokens=160)):
         print("\nQ:", q)
-        ans, chunks = answer(q, k=4, max_new_tokens=160)
         print("A:", ans)
         print("Sources:")
         for ch in chunks:
@@ -0,0 +1,40 @@
+# app/test_textscan.py
+import random
+from app import textscan
+from app.textscan import NUMERIC_RE, SENTENCE_RE
+
+# ASCII digits/punctuation/whitespace the scanners handle, plus non-ASCII letter, space
+# (\xa0) and digit that the regexes must ignore (re.ASCII)
+ALPHABET = "ab 12,.+-!?\t9é\xa0٣"
+
+def _regex_number(text: str) -> str:
+    m = NUMERIC_RE.search(text)
+    return m.group(0) if m else ""
+
+def _regex_sentence(text: str):
+    m = SENTENCE_RE.search(text)
+    return m.group(1) if m else None
+
+if __name__ == "__main__":
+    print("numba JIT:", "enabled" if textscan.njit is not None else "not installed (pure-Python scanners)")
+    rng = random.Random(0)
+    samples = [
+        "BTC/USD on 2024-01-02: open 42,100.5, high 43000, low 41000, close 42,800.25, volume 123.",
+        "Price fell -3.5% today. Next sentence!",
+        "no digits here",
+        "x.\xa0y",
+        "x٣٤ 5",
+        "",
+    ]
+    samples += ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 16))) for _ in range(20000)]
+
+    mismatches = 0
+    for text in samples:
+        if textscan.first_number(text) != _regex_number(text):
+            mismatches += 1
+            print("first_number mismatch:", repr(text), textscan.first_number(text), _regex_number(text))
+        if textscan.first_sentence(text) != _regex_sentence(text):
+            mismatches += 1
+            print("first_sentence mismatch:", repr(text), textscan.first_sentence(text), _regex_sentence(text))
+    print(f"Checked {len(samples)} inputs, {mismatches} mismatches.")
+    raise SystemExit(1 if mismatches else 0)
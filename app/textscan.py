@@ -0,0 +1,89 @@
+# app/textscan.py
+"""
+Byte-level scanners used by rag_chain's fallback extraction. They mirror
+NUMERIC_RE / SENTENCE_RE (ASCII digits and whitespace only) and are JIT-compiled
+with numba when it is installed (optional and off by default: `pip install numba`). Compilation happens
+in a background thread; until jit_ready() is True callers should use the regexes.
+See app/test_textscan.py for the equivalence check.
+"""
+from typing import Optional, Tuple
+import threading
+import re
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the regex path is always available
+    njit = None
+
+# numeric extraction regex (captures typical decimal numbers); re.ASCII keeps \d and \s
+# to ASCII digits/whitespace so the byte scanners below match it on any input
+NUMERIC_RE = re.compile(r'[-+]?\d{1,3}(?:[,\d]{0,})?(?:\.\d+)?', re.ASCII)
+
+# naive sentence boundary: shortest prefix ending in . ! or ? followed by whitespace
+SENTENCE_RE = re.compile(r'(.+?[\.!?])\s', re.ASCII)
+
+def _find_first_number(buf) -> Tuple[int, int]:
+    # same span as [-+]?\d[,\d]*(?:\.\d+)? ; returns (-1, -1) when there is no digit
+    n = len(buf)
+    for i in range(n):
+        if 48 <= buf[i] <= 57:
+            start = i
+            if i > 0 and (buf[i - 1] == 45 or buf[i - 1] == 43):  # '-' / '+'
+                start = i - 1
+            j = i + 1
+            while j < n and (48 <= buf[j] <= 57 or buf[j] == 44):  # digits / ','
+                j += 1
+            if j + 1 < n and buf[j] == 46 and 48 <= buf[j + 1] <= 57:  # '.' + digit
+                j += 2
+                while j < n and 48 <= buf[j] <= 57:
+                    j += 1
+            return start, j
+    return -1, -1
+
+def _find_sentence_end(buf) -> int:
+    # end of the shortest prefix matching (.+?[.!?])\s ; -1 when there is none
+    n = len(buf)
+    for j in range(1, n - 1):
+        c = buf[j]
+        if c == 46 or c == 33 or c == 63:  # '.', '!', '?'
+            w = buf[j + 1]
+            if w == 32 or 9 <= w <= 13:
+                return j + 1
+    return -1
+
+_JIT_READY = threading.Event()
+
+if njit is not None:
+    _find_first_number = njit(cache=True)(_find_first_number)
+    _find_sentence_end = njit(cache=True)(_find_sentence_end)
+
+    def _warm_up():
+        try:
+            sample = np.frombuffer(b"close 1,234.5. Next", dtype=np.uint8)
+            _find_first_number(sample)
+            _find_sentence_end(sample)
+            _JIT_READY.set()
+        except Exception:
+            pass  # leave callers on the regex path
+
+    threading.Thread(target=_warm_up, name="textscan-jit", daemon=True).start()
+
+def jit_ready() -> bool:
+    return _JIT_READY.is_set()
+
+def _as_bytes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+def first_number(text: str) -> str:
+    """First numeric token in text (commas kept), or ''."""
+    buf = _as_bytes(text)
+    start, end = _find_first_number(buf)
+    return buf[start:end].tobytes().decode("ascii") if start >= 0 else ""
+
+def first_sentence(text: str) -> Optional[str]:
+    """Text up to and including the first sentence terminator that is followed by whitespace, or None."""
+    buf = _as_bytes(text)
+    end = _find_sentence_end(buf)
+    # the cut is right after an ASCII byte, so it never splits a UTF-8 sequence
+    return buf[:end].tobytes().decode("utf-8") if end > 0 else None
@@ -6,7 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import streamlit as st
 import re
 from app.ingest_api import build_api_docs
-from app.index import build_index, get_collection
+from app.index import build_index, clear_collection, index_version as current_index_version
 from app.rag_chain import answer
 from app.utils import identity_chunk
 from app.config import CHROMA_DIR
@@ -68,8 +68,7 @@ with st.sidebar:
     with col2:
         if st.button("🧹 Clear local index"):
             try:
-                col = get_collection("docs")
-                col.delete(where={})
+                clear_collection("docs")
                 st.success("Cleared local Chroma collection 'docs'.")
             except Exception as e:
                 st.error(f"Clear failed: {e}")
@@ -95,20 +94,29 @@ with ask_col1:
 with ask_col2:
     st.write("")  # spacer to align
 
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_NUMBER_RE = re.compile(r"(\d{1,3}(?:[,\d]{0,})?(?:\.\d+)?)")
+
 # helper to highlight numeric tokens and dates
 def highlight_numbers_and_dates(s: str) -> str:
-    s = re.sub(r"(\d{4}-\d{2}-\d{2})", r"**\1**", s)  # dates
-    s = re.sub(r"(\d{1,3}(?:[,\d]{0,})?(?:\.\d+)?)", r"**\1**", s)  # numbers
+    s = _DATE_RE.sub(r"**\1**", s)  # dates
+    s = _NUMBER_RE.sub(r"**\1**", s)  # numbers
     return s
 
-if ask_btn and user_query:
-    q = user_query
-    if filter_symbol and filter_symbol != "(none)":
+@st.cache_data(ttl=600, max_entries=128, show_spinner=False)
+def ask(q: str, sym: str, index_version: int):
+    # index_version is only part of the cache key: app.index bumps it process-wide on every
+    # build/clear that changes rows, so no session is served answers from an older index
+    if sym:
         # bias the query with the symbol hint
-        q = f"{filter_symbol} {user_query}"
+        q = f"{sym} {q}"
+    return answer(q, k=6)
 
+if ask_btn and user_query:
+    sym = filter_symbol if filter_symbol and filter_symbol != "(none)" else ""
     with st.spinner("Thinking..."):
-        ans, chunks = answer(q, k=6)
+        # normalize whitespace so trivially different inputs share a cache entry
+        ans, chunks = ask(" ".join(user_query.split()), sym, current_index_version())
 
     st.markdown("### 🧠 Answer")
     # Try to render markdown with highlighted numbers
@@ -124,8 +132,7 @@ if ask_btn and user_query:
         doc_id = m.get("doc_id", "")
         st.markdown(f"**{idx}. {doc_id}** — {m.get('type','')}, score={ch['score']:.4f}")
         preview = ch["text"][:400].replace("\n", " ")
-        preview = re.sub(r"(\d{4}-\d{2}-\d{2})", r"**\1**", preview)
-        preview = re.sub(r"(\d{1,3}(?:[,\d]{0,})?(?:\.\d+)?)", r"**\1**", preview)
+        preview = highlight_numbers_and_dates(preview)
         with st.expander("Preview / Show full text"):
             st.write(preview)
             st.write("---")
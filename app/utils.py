@@ -1,3 +1,20 @@
 # app/utils.py
+from functools import lru_cache
+
 def identity_chunk(text: str):
     return [text] if text else []
+
+@lru_cache(maxsize=1)
+def _cpu_flags() -> frozenset:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return frozenset(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return frozenset()
+
+def cpu_has_flag(flag: str) -> bool:
+    """True if /proc/cpuinfo advertises the given flag (e.g. 'avx512_vnni'). False when unknown."""
+    return flag in _cpu_flags()